@@ -2,11 +2,12 @@
 Script to add a doctor to the database
 Run this script to add a doctor with the specified credentials
 """
-from app import app, db
-from models import User, Doctor, Department
+from app import create_app
+from models import db, User, Doctor, Department
 from werkzeug.security import generate_password_hash
 
 def add_doctor():
+    app = create_app(web=False)
     with app.app_context():
         # Doctor details
         username = 'ankit12'
@@ -1,34 +1,115 @@
+import os
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from werkzeug.security import generate_password_hash
-from models import db, User
-from routes.auth_routes import auth_bp
-from routes.admin_routes import admin_bp
-from routes.doctor_routes import doctor_bp
-from routes.patient_routes import patient_bp
+from models import db, User, upgrade_schema
 
-def create_app():
+def create_app(config=None, web=True):
+    """Build the application.
+
+    Scripts that only need the database (e.g. add_doctor.py) pass web=False to
+    skip importing the blueprints and setting up the request-time machinery.
+    """
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Rate limits: (burst capacity, refill period in seconds) per scope
+    app.config['RATELIMITS'] = {
+        'auth.login': {'methods': ['POST'], 'ip': (10, 60), 'endpoint': (300, 60)},
+        'patient.book_appointment': {'user': (5, 60), 'ip': (20, 60), 'endpoint': (200, 60)},
+    }
+    # Bookings allowed in flight at once: (slots, seconds to wait for a slot)
+    app.config['ADMISSION_QUEUES'] = {'booking': (8, 0.5)}
+    
+    # Compiled templates are cached on disk so restarted workers skip compilation
+    app.config['JINJA_CACHE_DIR'] = os.path.join(app.instance_path, 'jinja_cache')
+    
+    if config:
+        app.config.update(config)
+    
     # Initialize database
     db.init_app(app)
     
+    if not web:
+        return app
+    
+    # Imported here so database-only scripts don't pay for the web stack
+    import ratelimit
+    import assets
+    import live_queue
+    import medicine_catalog
+    import backup
+    import audit
+    import purge
+    from commands import register_commands
+    from routes.auth_routes import auth_bp
+    from routes.admin_routes import admin_bp
+    from routes.doctor_routes import doctor_bp
+    from routes.patient_routes import patient_bp
+    
+    # The Jinja environment is created lazily on first render; configure the
+    # bytecode cache before that happens
+    os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR']),
+    }
+    
+    # Initialize rate limiting and admission control
+    ratelimit.init_app(app)
+    
+    # Fingerprinted static assets and response compression
+    assets.init_app(app)
+    
+    # Live doctor queue over server-sent events
+    live_queue.init_app(app)
+    
+    # In-memory prefix index over the medicine catalog
+    medicine_catalog.init_app(app)
+    
+    # Online backups (and the optional backup schedule)
+    backup.init_app(app)
+    
+    # Audit trail, written in batches off the request path
+    audit.init_app(app)
+    
+    # Set-based deletion of doctors and patients
+    purge.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(doctor_bp)
     app.register_blueprint(patient_bp)
     
+    register_commands(app)
+    
     return app
 
-app = create_app()
+_app = None
+
+def get_app():
+    """The shared web application, created on first use."""
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+def __getattr__(name):
+    # `from app import app` keeps working but no longer builds the
+    # application as a side effect of importing this module
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Initialize database and create admin user
-def init_db():
+def init_db(app=None):
+    app = app or get_app()
     with app.app_context():
         db.create_all()
+        upgrade_schema()
         
         # Create admin user if it doesn't exist
         if not User.query.filter_by(role='admin').first():
@@ -42,5 +123,6 @@ def init_db():
             print("Admin user created: username='admin', password='admin123'")
 
 if __name__ == '__main__':
-    init_db()
+    app = get_app()
+    init_db(app)
     app.run(debug=True)
@@ -0,0 +1,232 @@
+"""
+Async read API for the high-fan-out directory and availability pages.
+
+An ASGI application serving read-only JSON under /api/ from SQLAlchemy's
+async engine (aiosqlite). A slow client waiting on an /api/ response costs an
+idle coroutine rather than a whole sync worker.
+
+Run it next to the site, not instead of it: keep the Flask application on
+its own WSGI server and have the reverse proxy send /api/ to
+
+    uvicorn asgi:application
+
+with ASYNC_API_MOUNT_SITE = False in the Flask config.
+
+By default the Flask application is also mounted at / so a single process
+serves everything during development. That mount runs Flask on a pool of
+ASYNC_API_WSGI_WORKERS threads (default 10), and every open doctor
+dashboard holds one of them for as long as its /doctor/queue/stream
+connection lasts; once the pool is taken by streams, every other page
+waits.
+
+The API shares models.py and the Flask session cookie, so a patient logged
+in through the site can call it directly:
+
+    GET /api/departments
+    GET /api/departments/<id>/doctors
+    GET /api/doctors/<id>
+    GET /api/doctors/<id>/availability
+
+Requires the optional packages listed under "Async read API" in
+requirements.txt.
+"""
+import contextlib
+from datetime import datetime, timedelta
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from models import db, User, Department, Doctor, Appointment, DoctorAvailability
+
+SLOTS = {'morning': '08:00-12:00', 'evening': '16:00-21:00'}
+AVAILABILITY_DAYS = 7
+
+
+def departments_query():
+    return select(Department.id, Department.name, Department.description).order_by(Department.name)
+
+
+def department_doctors_query(department_id):
+    return (
+        select(Doctor.id, Doctor.fullname, Doctor.specialization, Doctor.experience)
+        .join(User)
+        .where(Doctor.department_id == department_id, User.is_blacklisted == False)
+        .order_by(Doctor.fullname)
+    )
+
+
+def doctor_query(doctor_id):
+    return (
+        select(Doctor.id, Doctor.fullname, Doctor.specialization, Doctor.experience,
+               Doctor.qualifications, Department.name.label('department'))
+        .join(User)
+        .outerjoin(Department)
+        .where(Doctor.id == doctor_id, User.is_blacklisted == False)
+    )
+
+
+def availability_queries(doctor_id, start_date, end_date):
+    """(availability rows, booked counts per slot) for the week: two queries
+    instead of three per day."""
+    availability = select(DoctorAvailability).where(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date.between(start_date, end_date)
+    )
+    booked = (
+        select(Appointment.appointment_date, Appointment.appointment_time,
+               func.count(Appointment.id).label('count'))
+        .where(
+            Appointment.doctor_id == doctor_id,
+            Appointment.status == 'Booked',
+            Appointment.appointment_date.between(start_date, end_date)
+        )
+        .group_by(Appointment.appointment_date, Appointment.appointment_time)
+    )
+    return availability, booked
+
+
+def availability_days(start_date, availabilities, booked):
+    """JSON-ready slots per day from availability_queries() results."""
+    availabilities = {a.date: a for a in availabilities}
+    booked = {(row.appointment_date, row.appointment_time): row.count for row in booked}
+    days = []
+    for i in range(AVAILABILITY_DAYS):
+        date = start_date + timedelta(days=i)
+        avail = availabilities.get(date)
+        day = {'date': date.isoformat()}
+        for slot, time in SLOTS.items():
+            offered = bool(avail and getattr(avail, f'{slot}_slot'))
+            capacity = avail.max_appointments_per_slot if avail else 0
+            count = booked.get((date, time), 0)
+            day[slot] = {
+                'time': time,
+                'offered': offered,
+                'booked': count,
+                'available': max(capacity - count, 0) if offered else 0,
+            }
+        days.append(day)
+    return days
+
+
+def _async_url(flask_app):
+    # Reuse the sync URL, which Flask-SQLAlchemy has already resolved to an
+    # absolute path under the instance folder
+    with flask_app.app_context():
+        url = db.engine.url
+    return url.set(drivername='sqlite+aiosqlite')
+
+
+class ReadAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engine = create_async_engine(_async_url(flask_app))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    async def _require_patient(self, request, session):
+        # Same rule as role_required(['patient']) in the Flask routes
+        cookie = request.cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not cookie:
+            raise HTTPException(401, 'Please login to access this page.')
+        try:
+            data = self.serializer.loads(cookie, max_age=self.max_age)
+        except BadSignature:
+            raise HTTPException(401, 'Please login to access this page.')
+        if 'user_id' not in data:
+            raise HTTPException(401, 'Please login to access this page.')
+        user = await session.get(User, data['user_id'])
+        if not user or user.role != 'patient' or user.is_blacklisted:
+            raise HTTPException(403, 'You do not have permission to access this page.')
+
+    async def departments(self, request):
+        async with self.sessions() as session:
+            await self._require_patient(request, session)
+            rows = await session.execute(departments_query())
+            return JSONResponse([dict(row._mapping) for row in rows])
+
+    async def department_doctors(self, request):
+        department_id = request.path_params['department_id']
+        async with self.sessions() as session:
+            await self._require_patient(request, session)
+            if await session.get(Department, department_id) is None:
+                raise HTTPException(404)
+            rows = await session.execute(department_doctors_query(department_id))
+            return JSONResponse([dict(row._mapping) for row in rows])
+
+    async def _active_doctor(self, session, doctor_id):
+        row = (await session.execute(doctor_query(doctor_id))).first()
+        if row is None:
+            raise HTTPException(404, 'This doctor is not available.')
+        return dict(row._mapping)
+
+    async def doctor(self, request):
+        async with self.sessions() as session:
+            await self._require_patient(request, session)
+            return JSONResponse(await self._active_doctor(session, request.path_params['doctor_id']))
+
+    async def doctor_availability(self, request):
+        doctor_id = request.path_params['doctor_id']
+        start_date = datetime.now().date()
+        end_date = start_date + timedelta(days=AVAILABILITY_DAYS - 1)
+
+        async with self.sessions() as session:
+            await self._require_patient(request, session)
+            await self._active_doctor(session, doctor_id)
+
+            availability, booked = availability_queries(doctor_id, start_date, end_date)
+            availabilities = (await session.scalars(availability)).all()
+            booked = (await session.execute(booked)).all()
+
+        days = availability_days(start_date, availabilities, booked)
+        return JSONResponse({'doctor_id': doctor_id, 'days': days})
+
+    def routes(self):
+        return [
+            Route('/departments', self.departments),
+            Route('/departments/{department_id:int}/doctors', self.department_doctors),
+            Route('/doctors/{doctor_id:int}', self.doctor),
+            Route('/doctors/{doctor_id:int}/availability', self.doctor_availability),
+        ]
+
+
+async def _http_error(request, exc):
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code)
+
+
+def create_asgi_app(flask_app=None):
+    """The read API at /api, plus `flask_app` at / unless ASYNC_API_MOUNT_SITE
+    is False."""
+    if flask_app is None:
+        from app import get_app
+        flask_app = get_app()
+    api = ReadAPI(flask_app)
+
+    routes = [Mount('/api', routes=api.routes())]
+    if flask_app.config.get('ASYNC_API_MOUNT_SITE', True):
+        workers = flask_app.config.get('ASYNC_API_WSGI_WORKERS', 10)
+        routes.append(Mount('/', app=WSGIMiddleware(flask_app, workers=workers)))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        await api.engine.dispose()
+
+    return Starlette(
+        routes=routes,
+        exception_handlers={HTTPException: _http_error},
+        lifespan=lifespan,
+    )
+
+
+def __getattr__(name):
+    # Built on first access so importing this module has no side effects
+    if name == 'application':
+        global application
+        application = create_asgi_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,155 @@
+"""
+Static asset pipeline and HTTP response compression.
+
+`flask --app app assets build` copies every file under static/ to
+static/dist/ with a content hash in its name, alongside pre-compressed .gz
+(and .br when the optional `brotli` package is installed) variants, and
+writes static/dist/manifest.json. Templates link assets with
+`asset_url('css/style.css')`, which emits the hashed URL when a build exists
+and falls back to the plain static URL otherwise. Hashed files never change,
+so they are served with a far-future Cache-Control header.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ico'}
+ONE_YEAR = 365 * 24 * 60 * 60
+
+assets_bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+
+def _hashed_name(relpath, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    root, ext = os.path.splitext(relpath)
+    return f'{root}.{digest}{ext}'
+
+
+def build(static_folder):
+    """Fingerprint and pre-compress every file under `static_folder`.
+
+    Returns the manifest mapping original paths to hashed paths.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    os.makedirs(dist)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for name in files:
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            hashed = _hashed_name(relpath, data)
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                with open(target + '.gz', 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(data, quality=11))
+
+            manifest[relpath] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename):
+    """URL for a static file, fingerprinted when the asset build has run."""
+    manifest = current_app.extensions['assets']['manifest']
+    hashed = manifest.get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.serve', filename=hashed)
+
+
+@assets_bp.route('/<path:filename>')
+def serve(filename):
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST:
+        raise NotFound()
+
+    # Prefer a pre-compressed variant the client accepts
+    variant, encoding = filename, None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            variant, encoding = filename + suffix, candidate
+            break
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(dist, variant, mimetype=mimetype, max_age=ONE_YEAR)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    return response
+
+
+def compress_response(response):
+    """after_request hook gzipping large HTML/JSON responses."""
+    config = current_app.config
+    if not config['COMPRESS_ENABLED']:
+        return response
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.direct_passthrough or response.is_streamed
+            or response.content_encoding
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=config['COMPRESS_LEVEL']))
+    response.content_encoding = 'gzip'
+    if response.get_etag()[0]:
+        # The representation changed, so a strong ETag no longer matches it
+        response.set_etag(response.get_etag()[0], weak=True)
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_MIMETYPES', ['text/html', 'application/json'])
+
+    app.extensions['assets'] = {'manifest': load_manifest(app.static_folder)}
+    app.register_blueprint(assets_bp)
+    app.add_template_global(asset_url)
+    app.after_request(compress_response)
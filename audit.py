@@ -0,0 +1,304 @@
+"""
+Audit trail of admin and clinical changes.
+
+ORM session events capture every insert, update and delete of the audited
+models along with who made it. Entries are held until the transaction
+commits (and dropped if it rolls back), then handed to a background writer
+that flushes them in batches so requests never wait on an audit insert.
+
+AUDIT_SINK selects where batches go:
+  - 'db' (default): the audit_log table, one multi-row insert per batch.
+  - 'jsonl': append-only JSON Lines segment files in AUDIT_DIR, rotated once
+    a segment reaches AUDIT_SEGMENT_BYTES.
+
+Bulk statements (Query.delete(), insert()/update() constructs) bypass the
+session events; code issuing them calls record() explicitly.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+from flask import current_app, has_request_context, request, session as flask_session
+from sqlalchemy import event, inspect
+from models import (db, AuditLog, User, Department, Doctor, Patient, Appointment,
+                    Treatment, Medicine, MedicineCatalog, DoctorAvailability)
+
+AUDITED_MODELS = (User, Department, Doctor, Patient, Appointment, Treatment,
+                  Medicine, MedicineCatalog, DoctorAvailability)
+REDACTED_COLUMNS = {'password_hash'}
+SEGMENT_PREFIX = 'audit-'
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def current_actor():
+    """Who is making the current change, from the request if there is one."""
+    if not has_request_context():
+        return {'user_id': None, 'username': None, 'endpoint': None, 'ip': None}
+    return {
+        'user_id': flask_session.get('user_id'),
+        'username': flask_session.get('username'),
+        'endpoint': request.endpoint,
+        'ip': request.remote_addr,
+    }
+
+
+def _entry(action, entity, entity_id, changes, actor=None):
+    return {
+        'created_at': datetime.utcnow(),
+        'action': action,
+        'entity': entity,
+        'entity_id': entity_id,
+        'changes': json.dumps(changes, default=str) if changes else None,
+        **(actor or current_actor()),
+    }
+
+
+def _snapshot(obj):
+    # Read loaded values only; never trigger a lazy load mid-flush
+    state = inspect(obj)
+    return {
+        key: '<redacted>' if key in REDACTED_COLUMNS else _value(state.dict[key])
+        for key in state.mapper.columns.keys()
+        if key in state.dict
+    }
+
+
+def _entity_id(obj):
+    # Not state.identity: in after_flush that is still None for objects
+    # that were just inserted
+    state = inspect(obj)
+    return state.mapper.primary_key_from_instance(obj)[0]
+
+
+def _diff(obj):
+    state = inspect(obj)
+    changes = {}
+    for attr in state.attrs:
+        if attr.key not in state.mapper.columns:
+            continue
+        history = attr.history
+        if not history.has_changes():
+            continue
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        if old == new:
+            continue
+        if attr.key in REDACTED_COLUMNS:
+            changes[attr.key] = '<changed>'
+        else:
+            changes[attr.key] = [_value(old), _value(new)]
+    return changes
+
+
+def _after_flush(session, flush_context):
+    # Runs while the session still holds the pre-flush new/dirty/deleted
+    # collections and attribute history; new rows' primary keys are already
+    # populated on the objects, though not yet in their identity
+    actor = current_actor()
+    entries = session.info.setdefault('audit_entries', [])
+    for obj in session.new:
+        if isinstance(obj, AUDITED_MODELS):
+            entries.append(_entry('create', type(obj).__name__, _entity_id(obj), _snapshot(obj), actor))
+    for obj in session.dirty:
+        if isinstance(obj, AUDITED_MODELS):
+            changes = _diff(obj)
+            if changes:
+                entries.append(_entry('update', type(obj).__name__, _entity_id(obj), changes, actor))
+    for obj in session.deleted:
+        if isinstance(obj, AUDITED_MODELS):
+            entries.append(_entry('delete', type(obj).__name__, _entity_id(obj), _snapshot(obj), actor))
+
+
+def _after_commit(session):
+    entries = session.info.pop('audit_entries', None)
+    if entries and current_app:
+        writer = current_app.extensions.get('audit')
+        if writer:
+            writer.enqueue(entries)
+
+
+def _after_rollback(session):
+    session.info.pop('audit_entries', None)
+
+
+def record(action, entity, entity_id=None, details=None, actor=None):
+    """Add an explicit entry to the current transaction's audit trail.
+
+    Pass `actor` (from current_actor()) when recording outside the request
+    that asked for the change, e.g. from a background job.
+    """
+    db.session.info.setdefault('audit_entries', []).append(
+        _entry(action, entity, entity_id, details, actor)
+    )
+
+
+class DatabaseSink:
+    def __init__(self, app):
+        self.app = app
+
+    def write(self, entries):
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(AuditLog.__table__.insert(), entries)
+
+
+class JSONLSink:
+    def __init__(self, directory, segment_bytes):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.path = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _new_segment(self):
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        # One segment per process, so workers never interleave writes
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX}{stamp}-{os.getpid()}.jsonl')
+
+    def write(self, entries):
+        if self.path is None or os.path.getsize(self.path) >= self.segment_bytes:
+            self.path = self._new_segment()
+        data = ''.join(json.dumps(e, default=_value) + '\n' for e in entries)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+
+
+class AuditWriter:
+    """Collects committed entries and writes them in batches off-request."""
+
+    def __init__(self, sink, batch_size=100, flush_interval=2.0, logger=None):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, entries):
+        for entry in entries:
+            self._queue.put(entry)
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.sink.write(batch)
+        except Exception:
+            if self.logger:
+                self.logger.exception('failed to write %d audit entries', len(batch))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Keep collecting until the batch is full or the interval is up
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        """Write everything queued so far on the calling thread."""
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            self._write(batch)
+
+
+def query(entity=None, action=None, username=None, page=1, per_page=50):
+    """Audit entries newest first, as (entries, has_next)."""
+    if current_app.config['AUDIT_SINK'] == 'jsonl':
+        return _query_jsonl(entity, action, username, page, per_page)
+
+    q = AuditLog.query
+    if entity:
+        q = q.filter(AuditLog.entity == entity)
+    if action:
+        q = q.filter(AuditLog.action == action)
+    if username:
+        q = q.filter(AuditLog.username == username)
+    rows = q.order_by(AuditLog.id.desc()).offset((page - 1) * per_page).limit(per_page + 1).all()
+    entries = [{c.key: getattr(row, c.key) for c in AuditLog.__table__.columns} for row in rows]
+    for entry in entries:
+        entry['changes'] = json.loads(entry['changes']) if entry['changes'] else {}
+    return entries[:per_page], len(entries) > per_page
+
+
+def _query_jsonl(entity, action, username, page, per_page):
+    directory = current_app.config['AUDIT_DIR']
+    segments = sorted(
+        (n for n in os.listdir(directory) if n.startswith(SEGMENT_PREFIX)),
+        reverse=True
+    ) if os.path.isdir(directory) else []
+
+    skip, entries = (page - 1) * per_page, []
+    for name in segments:
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            entry = json.loads(line)
+            if ((entity and entry['entity'] != entity) or (action and entry['action'] != action)
+                    or (username and entry['username'] != username)):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+            entry['changes'] = json.loads(entry['changes']) if entry['changes'] else {}
+            entries.append(entry)
+            if len(entries) > per_page:
+                return entries[:per_page], True
+    return entries, False
+
+
+def init_app(app):
+    app.config.setdefault('AUDIT_SINK', 'db')
+    app.config.setdefault('AUDIT_DIR', os.path.join(app.instance_path, 'audit'))
+    app.config.setdefault('AUDIT_SEGMENT_BYTES', 10 * 1024 * 1024)
+    app.config.setdefault('AUDIT_BATCH_SIZE', 100)
+    app.config.setdefault('AUDIT_FLUSH_INTERVAL', 2.0)
+
+    if app.config['AUDIT_SINK'] == 'jsonl':
+        sink = JSONLSink(app.config['AUDIT_DIR'], app.config['AUDIT_SEGMENT_BYTES'])
+    else:
+        sink = DatabaseSink(app)
+    app.extensions['audit'] = AuditWriter(
+        sink,
+        batch_size=app.config['AUDIT_BATCH_SIZE'],
+        flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+        logger=app.logger
+    )
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
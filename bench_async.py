@@ -0,0 +1,309 @@
+"""
+Concurrent-connection benchmark: async read API vs. the sync Flask pages.
+
+Starts two servers against the same seeded temporary database:
+  - sync:  the Flask app on a WSGI server with a fixed pool of worker threads,
+           plus /sync-api/, the read API's JSON endpoints served by Flask
+           with the same queries (asgi.py's query builders) on the sync engine
+  - async: asgi.application on uvicorn (single process, event loop)
+
+Each JSON endpoint is timed on both servers, so the comparison isolates sync
+vs async I/O. The patient HTML pages, which run their own per-day queries and
+render templates, are timed on the sync server as extra rows for reference.
+
+and drives each with many concurrent keep-alive-free connections for a fixed
+duration. With --slow-ms each client dribbles its request headers, the way
+clients on a poor connection do, which holds a sync worker for the whole
+upload but costs the async server nothing.
+
+Run with: python bench_async.py [--connections 200] [--duration 10] [--slow-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (label, sync path, async path); {doctor} and {department} are filled in.
+# Rows without an async path are sync-only baselines
+ENDPOINTS = [
+    ('availability', '/sync-api/doctors/{doctor}/availability', '/api/doctors/{doctor}/availability'),
+    ('doctor profile', '/sync-api/doctors/{doctor}', '/api/doctors/{doctor}'),
+    ('department', '/sync-api/departments/{department}/doctors', '/api/departments/{department}/doctors'),
+    ('avail. (HTML)', '/patient/doctors/{doctor}/availability', None),
+    ('profile (HTML)', '/patient/doctors/{doctor}', None),
+    ('dept. (HTML)', '/patient/departments/{department}', None),
+]
+
+
+def _config(db_path):
+    return {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path,
+        'JINJA_CACHE_DIR': os.path.join(os.path.dirname(db_path), 'jinja_cache'),
+        'RATELIMIT_ENABLED': False,
+    }
+
+
+def seed(db_path):
+    """Create the database; prints the patient's session cookie and ids."""
+    from datetime import date, timedelta
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db, User, Doctor, Patient, Department, Appointment, DoctorAvailability
+
+    app = create_app(_config(db_path))
+    with app.app_context():
+        db.create_all()
+        department = Department(name='General', description='General department')
+        db.session.add(department)
+        db.session.flush()
+        doctors = []
+        for i in range(20):
+            user = User(username=f'doctor{i}', password_hash='-', role='doctor')
+            db.session.add(user)
+            db.session.flush()
+            doctor = Doctor(user_id=user.id, fullname=f'Doctor {i}', specialization='General',
+                            department_id=department.id, experience=i)
+            db.session.add(doctor)
+            doctors.append(doctor)
+        user = User(username='patient', password_hash=generate_password_hash('patient'), role='patient')
+        db.session.add(user)
+        db.session.flush()
+        patient = Patient(user_id=user.id, fullname='Bench Patient')
+        db.session.add(patient)
+        db.session.flush()
+        for doctor in doctors:
+            for i in range(7):
+                day = date.today() + timedelta(days=i)
+                db.session.add(DoctorAvailability(doctor_id=doctor.id, date=day,
+                                                  morning_slot=True, evening_slot=True))
+                for slot in ('08:00-12:00', '16:00-21:00'):
+                    db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                                               appointment_date=day, appointment_time=slot))
+        db.session.commit()
+        doctor_id, department_id, user_id = doctors[0].id, department.id, user.id
+
+    cookie = app.session_interface.get_signing_serializer(app).dumps(
+        {'user_id': user_id, 'username': 'patient', 'role': 'patient'}
+    )
+    print(f'{cookie} {doctor_id} {department_id}')
+
+
+def _sync_api():
+    """The read API's endpoints as a Flask blueprint on the sync engine."""
+    from datetime import datetime, timedelta
+    from flask import Blueprint, abort, jsonify
+    from asgi import (AVAILABILITY_DAYS, availability_days, availability_queries,
+                      department_doctors_query, departments_query, doctor_query)
+    from models import db, Department
+    from utils import role_required
+
+    bp = Blueprint('sync_api', __name__, url_prefix='/sync-api')
+
+    def active_doctor(doctor_id):
+        row = db.session.execute(doctor_query(doctor_id)).first()
+        if row is None:
+            abort(404)
+        return dict(row._mapping)
+
+    @bp.route('/departments')
+    @role_required(['patient'])
+    def departments():
+        return jsonify([dict(row._mapping) for row in db.session.execute(departments_query())])
+
+    @bp.route('/departments/<int:department_id>/doctors')
+    @role_required(['patient'])
+    def department_doctors(department_id):
+        if db.session.get(Department, department_id) is None:
+            abort(404)
+        rows = db.session.execute(department_doctors_query(department_id))
+        return jsonify([dict(row._mapping) for row in rows])
+
+    @bp.route('/doctors/<int:doctor_id>')
+    @role_required(['patient'])
+    def doctor(doctor_id):
+        return jsonify(active_doctor(doctor_id))
+
+    @bp.route('/doctors/<int:doctor_id>/availability')
+    @role_required(['patient'])
+    def doctor_availability(doctor_id):
+        start_date = datetime.now().date()
+        end_date = start_date + timedelta(days=AVAILABILITY_DAYS - 1)
+        active_doctor(doctor_id)
+        availability, booked = availability_queries(doctor_id, start_date, end_date)
+        days = availability_days(start_date, db.session.scalars(availability).all(),
+                                 db.session.execute(booked).all())
+        return jsonify({'doctor_id': doctor_id, 'days': days})
+
+    return bp
+
+
+def serve_sync(db_path, port, threads):
+    """Serve the Flask app with a fixed number of worker threads."""
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer
+    from app import create_app
+
+    pool = ThreadPoolExecutor(max_workers=threads)
+
+    class PooledWSGIServer(BaseWSGIServer):
+        request_queue_size = 1024
+
+        def process_request(self, request, client_address):
+            pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    app = create_app(_config(db_path))
+    app.register_blueprint(_sync_api())
+    PooledWSGIServer('127.0.0.1', port, app).serve_forever()
+
+
+def serve_async(db_path, port):
+    import uvicorn
+    from app import create_app
+    from asgi import create_asgi_app
+
+    uvicorn.run(create_asgi_app(create_app(_config(db_path))), host='127.0.0.1', port=port,
+                log_level='warning', backlog=1024)
+
+
+async def _request(port, path, cookie, slow):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [
+        f'GET {path} HTTP/1.1',
+        f'Host: 127.0.0.1:{port}',
+        f'Cookie: session={cookie}',
+        'User-Agent: bench_async',
+        'Accept: */*',
+        'Connection: close',
+    ]
+    try:
+        for line in lines:
+            writer.write(line.encode() + b'\r\n')
+            await writer.drain()
+            if slow:
+                await asyncio.sleep(slow)
+        writer.write(b'\r\n')
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    ok = status_line.split(b' ')[1:2] == [b'200']
+    return ok, time.perf_counter() - started
+
+
+async def _load(port, path, cookie, connections, duration, slow):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            try:
+                ok, latency = await _request(port, path, cookie, slow)
+            except OSError:
+                ok, latency = False, 0
+            if ok:
+                latencies.append(latency)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return latencies, errors
+
+
+def _wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--slow-ms', type=float, default=50, help='delay between request header lines')
+    parser.add_argument('--threads', type=int, default=8, help='sync server worker threads')
+    parser.add_argument('--seed', metavar='DB', help=argparse.SUPPRESS)
+    parser.add_argument('--serve', nargs=3, metavar=('KIND', 'DB', 'PORT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.seed)
+        return
+    if args.serve:
+        kind, db_path, port = args.serve
+        if kind == 'sync':
+            serve_sync(db_path, int(port), args.threads)
+        else:
+            serve_async(db_path, int(port))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        out = subprocess.run([sys.executable, __file__, '--seed', db_path], cwd=HERE,
+                             check=True, capture_output=True, text=True).stdout
+        cookie, doctor_id, department_id = out.split()[-3:]
+
+        servers = {}
+        try:
+            for kind in ('sync', 'async'):
+                port = _free_port()
+                servers[kind] = (port, subprocess.Popen(
+                    [sys.executable, __file__, '--threads', str(args.threads), '--serve', kind, db_path, str(port)],
+                    cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                ))
+                _wait_for_port(port)
+
+            print(f'{args.connections} connections for {args.duration:g}s each, '
+                  f'{args.slow_ms:g} ms between header lines, sync server with {args.threads} threads\n')
+            print(f"{'endpoint':<16}{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+            for label, sync_path, async_path in ENDPOINTS:
+                for kind, path in (('sync', sync_path), ('async', async_path)):
+                    if path is None:
+                        continue
+                    path = path.format(doctor=doctor_id, department=department_id)
+                    latencies, errors = asyncio.run(_load(
+                        servers[kind][0], path, cookie, args.connections, args.duration, args.slow_ms / 1000
+                    ))
+                    if latencies:
+                        latencies.sort()
+                        p50 = statistics.median(latencies) * 1000
+                        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+                    else:
+                        p50 = p95 = float('nan')
+                    print(f'{label:<16}{kind:<8}{len(latencies) / args.duration:>10.1f}'
+                          f'{p50:>10.1f}{p95:>10.1f}{errors:>8}')
+        finally:
+            for port, process in servers.values():
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
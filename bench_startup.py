@@ -0,0 +1,164 @@
+"""
+Startup-time benchmark.
+
+Measures, each in a fresh interpreter so nothing is already imported or
+compiled:
+  - time to import the app module and to build the web and database-only apps
+  - first and second request latency for each page, with an empty Jinja
+    bytecode cache (cold) and with a precompiled one (warm)
+
+Run with: python bench_startup.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (url, role of the logged-in user or None)
+ROUTES = [
+    ('/login', None),
+    ('/admin/dashboard', 'admin'),
+    ('/admin/doctors', 'admin'),
+    ('/admin/patients', 'admin'),
+    ('/admin/appointments', 'admin'),
+    ('/doctor/dashboard', 'doctor'),
+    ('/doctor/availability', 'doctor'),
+    ('/patient/dashboard', 'patient'),
+    ('/patient/history', 'patient'),
+    ('/patient/profile', 'patient'),
+]
+
+IMPORT_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app_module.create_app(web=False)
+t2 = time.perf_counter()
+app_module.create_app()
+t3 = time.perf_counter()
+print(json.dumps({'import app': t1 - t0, 'create_app(web=False)': t2 - t1, 'create_app()': t3 - t2}))
+"""
+
+
+def _run(args, env=None):
+    out = subprocess.run(
+        [sys.executable] + args, cwd=HERE, env=env,
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _seed(app):
+    from datetime import date
+    from werkzeug.security import generate_password_hash
+    from models import db, User, Doctor, Patient, Department, Appointment
+
+    users = {}
+    with app.app_context():
+        db.create_all()
+        for role in ('admin', 'doctor', 'patient'):
+            user = User(username=role, password_hash=generate_password_hash(role), role=role)
+            db.session.add(user)
+            db.session.flush()
+            users[role] = user.id
+        department = Department(name='General')
+        db.session.add(department)
+        db.session.flush()
+        doctor = Doctor(user_id=users['doctor'], fullname='Bench', specialization='General',
+                        department_id=department.id)
+        patient = Patient(user_id=users['patient'], fullname='Bench')
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                                   appointment_date=date.today(), appointment_time='08:00-12:00'))
+        db.session.commit()
+    return users
+
+
+def worker(url, role, db_path, cache_dir):
+    """Time the first two requests to `url` in this (fresh) process."""
+    import time
+    from app import create_app
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path,
+        'JINJA_CACHE_DIR': cache_dir,
+        'RATELIMIT_ENABLED': False,
+    })
+    users = _seed(app)
+    client = app.test_client()
+    if role:
+        with client.session_transaction() as session:
+            session['user_id'] = users[role]
+            session['username'] = role
+            session['role'] = role
+
+    timings = []
+    for _ in range(2):
+        t0 = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - t0)
+        assert response.status_code == 200, (url, response.status_code)
+    print(json.dumps({'first': timings[0], 'second': timings[1]}))
+
+
+def precompile(cache_dir):
+    from app import create_app
+    app = create_app({'JINJA_CACHE_DIR': cache_dir})
+    env = app.jinja_env
+    for name in env.list_templates(extensions=['html']):
+        env.get_template(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--worker', nargs=4, metavar=('URL', 'ROLE', 'DB', 'CACHE'), help=argparse.SUPPRESS)
+    parser.add_argument('--precompile', metavar='CACHE', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        url, role, db_path, cache_dir = args.worker
+        worker(url, None if role == '-' else role, db_path, cache_dir)
+        return
+    if args.precompile:
+        precompile(args.precompile)
+        print('{}')
+        return
+
+    ms = lambda seconds: f'{seconds * 1000:8.1f}'
+
+    print(f'Import / build time (median of {args.runs} runs, ms)')
+    samples = [_run(['-c', IMPORT_SNIPPET]) for _ in range(args.runs)]
+    for key in samples[0]:
+        print(f'  {key:<24}{ms(statistics.median(s[key] for s in samples))}')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        warm_cache = os.path.join(tmp, 'warm')
+        _run([__file__, '--precompile', warm_cache])
+
+        print(f'\nRequest latency (median of {args.runs} runs, ms)')
+        print(f"  {'route':<24}{'cold 1st':>8}{'warm 1st':>10}{'2nd':>8}")
+        for url, role in ROUTES:
+            results = {'cold': [], 'warm': []}
+            for i in range(args.runs):
+                for mode in results:
+                    db_path = os.path.join(tmp, f'{mode}-{i}.db')
+                    if os.path.exists(db_path):
+                        os.remove(db_path)
+                    cache_dir = warm_cache if mode == 'warm' else os.path.join(tmp, f'cold-{url.replace("/", "_")}-{i}')
+                    results[mode].append(_run([__file__, '--worker', url, role or '-', db_path, cache_dir]))
+            cold = statistics.median(r['first'] for r in results['cold'])
+            warm = statistics.median(r['first'] for r in results['warm'])
+            second = statistics.median(r['second'] for r in results['warm'])
+            print(f'  {url:<24}{ms(cold)}{ms(warm):>10}{ms(second)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Command line tools, available through `flask --app app <group> <command>`.
+"""
+import os
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import assets
+import medicine_catalog
+import backup
+import purge
+from models import db, DoctorPatient, upgrade_schema
+
+assets_cli = AppGroup('assets', help='Static asset pipeline.')
+templates_cli = AppGroup('templates', help='Jinja template cache.')
+doctor_patients_cli = AppGroup('doctor-patients', help='Doctor-patient relationship table.')
+medicines_cli = AppGroup('medicines', help='Medicine catalog.')
+backup_cli = AppGroup('backup', help='Database snapshots.')
+purge_cli = AppGroup('purge', help='Deferred doctor and patient purges.')
+
+
+@assets_cli.command('build')
+def build_assets():
+    """Fingerprint and pre-compress files under static/."""
+    manifest = assets.build(current_app.static_folder)
+    current_app.extensions['assets']['manifest'] = manifest
+    for original, hashed in sorted(manifest.items()):
+        click.echo(f'{original} -> {hashed}')
+    click.echo(f'{len(manifest)} asset(s) written to static/{assets.DIST_DIR}/')
+
+
+@templates_cli.command('precompile')
+def precompile_templates():
+    """Compile every template into the bytecode cache."""
+    env = current_app.jinja_env
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    click.echo(f"{len(names)} template(s) compiled into {current_app.config['JINJA_CACHE_DIR']}")
+
+
+@doctor_patients_cli.command('backfill')
+def backfill_doctor_patients():
+    """Rebuild doctor-patient relationships from existing appointments."""
+    db.create_all()
+    count = DoctorPatient.backfill()
+    db.session.commit()
+    click.echo(f'{count} doctor-patient relationship(s) written')
+
+
+@medicines_cli.command('backfill')
+def backfill_medicines():
+    """Link existing prescribed medicines to the catalog."""
+    db.create_all()
+    upgrade_schema()
+    count = medicine_catalog.backfill()
+    db.session.commit()
+    click.echo(f'{count} medicine spelling(s) linked to the catalog')
+
+
+def _snapshot_path(snapshot):
+    # Accept either a path or a file name inside BACKUP_DIR
+    if os.path.exists(snapshot):
+        return snapshot
+    return os.path.join(current_app.config['BACKUP_DIR'], snapshot)
+
+
+@backup_cli.command('create')
+def create_backup():
+    """Take a compressed, verified snapshot of the database."""
+    config = current_app.config
+    metrics = backup.create_backup(
+        backup.database_path(), config['BACKUP_DIR'],
+        pages=config['BACKUP_PAGES_PER_STEP'],
+        sleep=config['BACKUP_STEP_SLEEP'],
+        retention=config['BACKUP_RETENTION']
+    )
+    click.echo(f"Snapshot {metrics['snapshot']} written to {config['BACKUP_DIR']}")
+    click.echo(f"  {metrics['pages']} pages in {metrics['steps']} steps, "
+               f"{metrics['database_bytes']} -> {metrics['snapshot_bytes']} bytes")
+    click.echo(f"  {metrics['total_seconds']}s total ({metrics['copy_seconds']}s copying), "
+               f"{metrics['throughput_mb_s']} MB/s")
+    for name in metrics['rotated']:
+        click.echo(f'  removed old snapshot {name}')
+
+
+@backup_cli.command('list')
+def list_backups():
+    """List snapshots, newest first."""
+    for path in backup.list_snapshots(current_app.config['BACKUP_DIR']):
+        click.echo(f'{os.path.basename(path)}  {os.path.getsize(path)} bytes')
+
+
+@backup_cli.command('verify')
+@click.argument('snapshot')
+def verify_backup(snapshot):
+    """Integrity-check a snapshot."""
+    ok, result = backup.verify_snapshot(_snapshot_path(snapshot))
+    click.echo('ok' if ok else f'FAILED: {result}')
+    if not ok:
+        raise SystemExit(1)
+
+
+@backup_cli.command('restore')
+@click.argument('snapshot')
+@click.confirmation_option(prompt='This replaces the current database. Continue?')
+def restore_backup(snapshot):
+    """Replace the database with a snapshot."""
+    backup.restore_snapshot(_snapshot_path(snapshot), backup.database_path())
+    click.echo(f'Database restored from {snapshot}')
+
+
+@purge_cli.command('resume')
+def resume_purges():
+    """Finish deferred purges left pending by a stopped worker."""
+    db.create_all()
+    pending_ids = purge.pending_ids()
+    for pending_id in pending_ids:
+        counts = purge.run_pending(pending_id)
+        if counts is not None:
+            click.echo(f'purge {pending_id}: ' + ', '.join(f'{n} {table}' for table, n in counts.items()))
+    click.echo(f'{len(pending_ids)} pending purge(s) processed')
+
+
+def register_commands(app):
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(templates_cli)
+    app.cli.add_command(doctor_patients_cli)
+    app.cli.add_command(medicines_cli)
+    app.cli.add_command(backup_cli)
+    app.cli.add_command(purge_cli)
@@ -0,0 +1,239 @@
+"""
+Live doctor queue: pushes booking, cancellation and completion events to
+connected doctor dashboards over server-sent events.
+
+Every event is written to the queue_event table in the same transaction as
+the appointment change. Delivery to browsers goes through an in-process
+pub/sub broker:
+
+  - LIVE_QUEUE_FEED = 'memory' (default): events are published to the broker
+    as soon as their transaction commits. Suitable for a single worker.
+  - LIVE_QUEUE_FEED = 'sqlite': a feed thread in each worker tails the
+    queue_event table and publishes whatever any worker committed.
+
+Reconnecting browsers send Last-Event-ID and are replayed what they missed
+from the table. Pages pass the id they were rendered at on the first
+connect, so nothing committed between rendering and subscribing is lost.
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, url_for
+from sqlalchemy import event
+from models import db, QueueEvent
+
+HEARTBEAT_SECONDS = 15
+REPLAY_LIMIT = 200
+FEED_BATCH = 500
+
+
+class Broker:
+    """Fans events out to the subscribers of each doctor's queue."""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, doctor_id):
+        q = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(doctor_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, doctor_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(doctor_id)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[doctor_id]
+
+    def publish(self, doctor_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(doctor_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # A stalled client; cut it off; it replays on reconnect.
+                # Never block here: this runs on the committing request
+                # thread (or the feed thread)
+                self.unsubscribe(doctor_id, q)
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(None)
+                except queue.Full:
+                    pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+def _message(queue_event):
+    return {
+        'id': queue_event.id,
+        'doctor_id': queue_event.doctor_id,
+        'kind': queue_event.kind,
+        'payload': queue_event.payload,
+    }
+
+
+def format_sse(message):
+    return f"id: {message['id']}\nevent: {message['kind']}\ndata: {message['payload']}\n\n"
+
+
+def record(appointment, kind):
+    """Add a queue event for `appointment` to the current transaction."""
+    if appointment.id is None:
+        db.session.flush()
+    payload = {
+        'appointment_id': appointment.id,
+        'patient_id': appointment.patient_id,
+        'patient_name': appointment.patient.fullname,
+        'date': appointment.appointment_date.isoformat(),
+        'date_display': appointment.appointment_date.strftime('%d/%m/%Y'),
+        'time': appointment.appointment_time,
+        'update_url': url_for('doctor.update_appointment', appointment_id=appointment.id),
+        'history_url': url_for('doctor.view_patient_history', patient_id=appointment.patient_id),
+    }
+    db.session.add(QueueEvent(
+        doctor_id=appointment.doctor_id,
+        appointment_id=appointment.id,
+        kind=kind,
+        payload=json.dumps(payload)
+    ))
+
+
+def latest_id(doctor_id):
+    """Id of the newest event for `doctor_id`, 0 if there are none."""
+    return db.session.query(db.func.max(QueueEvent.id)).filter(
+        QueueEvent.doctor_id == doctor_id
+    ).scalar() or 0
+
+
+def replay(doctor_id, last_event_id):
+    """Events for `doctor_id` committed after `last_event_id`."""
+    events = QueueEvent.query.filter(
+        QueueEvent.doctor_id == doctor_id,
+        QueueEvent.id > last_event_id
+    ).order_by(QueueEvent.id).limit(REPLAY_LIMIT).all()
+    return [_message(e) for e in events]
+
+
+def stream(doctor_id, last_event_id=None):
+    """Generator of SSE text for one connected dashboard."""
+    state = current_app.extensions['live_queue']
+    _ensure_feed_thread(current_app._get_current_object())
+    q = state['broker'].subscribe(doctor_id)
+    try:
+        # Subscribe before replaying so nothing committed in between is lost;
+        # duplicates are skipped by id below
+        last_sent = last_event_id or 0
+        if last_event_id is not None:
+            for message in replay(doctor_id, last_event_id):
+                last_sent = message['id']
+                yield format_sse(message)
+        # Don't hold a pooled connection for the life of the stream
+        db.session.close()
+        yield 'retry: 3000\n\n'
+
+        while True:
+            try:
+                message = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if message is None:
+                return
+            if message['id'] > last_sent:
+                last_sent = message['id']
+                yield format_sse(message)
+    finally:
+        state['broker'].unsubscribe(doctor_id, q)
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.setdefault('queue_events', [])
+    for obj in session.new:
+        if isinstance(obj, QueueEvent):
+            pending.append(_message(obj))
+
+
+def _after_commit(session):
+    pending = session.info.pop('queue_events', None)
+    if not pending or not current_app:
+        return
+    state = current_app.extensions.get('live_queue')
+    if state and current_app.config['LIVE_QUEUE_FEED'] == 'memory':
+        for message in pending:
+            state['broker'].publish(message['doctor_id'], message)
+
+
+def _after_rollback(session):
+    session.info.pop('queue_events', None)
+
+
+def _feed_loop(app, state):
+    interval = app.config['LIVE_QUEUE_POLL_INTERVAL']
+    retention = timedelta(hours=app.config['LIVE_QUEUE_RETENTION_HOURS'])
+    tail = app.config['LIVE_QUEUE_FEED'] == 'sqlite'
+    last_id = None
+    last_prune = 0
+
+    while True:
+        try:
+            with app.app_context():
+                if tail and last_id is not None and state['broker'].subscriber_count():
+                    rows = QueueEvent.query.filter(
+                        QueueEvent.id > last_id
+                    ).order_by(QueueEvent.id).limit(FEED_BATCH).all()
+                    for row in rows:
+                        state['broker'].publish(row.doctor_id, _message(row))
+                        last_id = row.id
+                else:
+                    # Nobody is listening; skip ahead so the next dashboard
+                    # to connect isn't sent the backlog (it replays by
+                    # Last-Event-ID instead)
+                    last_id = db.session.query(db.func.max(QueueEvent.id)).scalar() or 0
+                if time.monotonic() - last_prune > 3600:
+                    QueueEvent.query.filter(
+                        QueueEvent.created_at < datetime.utcnow() - retention
+                    ).delete(synchronize_session=False)
+                    db.session.commit()
+                    last_prune = time.monotonic()
+        except Exception:
+            app.logger.exception('live queue feed failed')
+        time.sleep(interval if tail else 60)
+
+
+def _ensure_feed_thread(app):
+    state = app.extensions['live_queue']
+    with state['lock']:
+        if state['thread'] is None:
+            state['thread'] = threading.Thread(
+                target=_feed_loop, args=(app, state), name='live-queue-feed', daemon=True
+            )
+            state['thread'].start()
+
+
+def init_app(app):
+    app.config.setdefault('LIVE_QUEUE_FEED', 'memory')
+    app.config.setdefault('LIVE_QUEUE_POLL_INTERVAL', 1.0)
+    app.config.setdefault('LIVE_QUEUE_RETENTION_HOURS', 24)
+
+    app.extensions['live_queue'] = {
+        'broker': Broker(),
+        'thread': None,
+        'lock': threading.Lock(),
+    }
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,163 @@
+"""
+Medicine catalog lookup.
+
+Each worker keeps the catalog in a sorted in-memory list and answers
+autocomplete queries with a binary search for the typed prefix. The index is
+loaded on first use, updated in place when this worker adds a medicine, and
+re-checked against the database every MEDICINE_INDEX_REFRESH seconds to pick
+up medicines added by other workers. If a transaction that added entries rolls
+back, the index is reloaded on the next lookup.
+"""
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, MedicineCatalog, Medicine
+import audit
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+
+class PrefixIndex:
+    """Catalog entries sorted by normalized name for prefix search."""
+
+    def __init__(self):
+        self._entries = []  # (normalized_name, id, name)
+        self._version = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def load(self, entries, version):
+        with self._lock:
+            self._entries = sorted(entries)
+            self._version = version
+
+    def add(self, normalized_name, entry_id, name):
+        with self._lock:
+            entry = (normalized_name, entry_id, name)
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                return
+            self._entries.insert(i, entry)
+            # Keep the (count, max id) version in step with the catalog so
+            # the next check doesn't reload it for an entry already here
+            if self._version is not None:
+                count, max_id = self._version
+                self._version = (count + 1, max(max_id or 0, entry_id))
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def get(self, normalized_name):
+        entries = self._entries
+        i = bisect_left(entries, (normalized_name,))
+        if i < len(entries) and entries[i][0] == normalized_name:
+            return entries[i]
+        return None
+
+    def search(self, prefix, limit=10):
+        entries = self._entries
+        prefix = normalize(prefix)
+        results = []
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(results) < limit and entries[i][0].startswith(prefix):
+            results.append(entries[i])
+            i += 1
+        return results
+
+    def needs_check(self, interval):
+        return self._version is None or time.monotonic() - self._checked >= interval
+
+    def mark_checked(self):
+        self._checked = time.monotonic()
+
+
+def _catalog_version():
+    return db.session.query(db.func.count(MedicineCatalog.id), db.func.max(MedicineCatalog.id)).one()
+
+
+def get_index():
+    """The worker's prefix index, (re)loaded if the catalog has changed."""
+    index = current_app.extensions['medicine_index']
+    if index.needs_check(current_app.config['MEDICINE_INDEX_REFRESH']):
+        version = tuple(_catalog_version())
+        if version != index._version:
+            rows = db.session.query(
+                MedicineCatalog.normalized_name, MedicineCatalog.id, MedicineCatalog.name
+            ).all()
+            index.load([tuple(row) for row in rows], version)
+        index.mark_checked()
+    return index
+
+
+def search(prefix, limit=10):
+    return [{'id': entry_id, 'name': name} for _, entry_id, name in get_index().search(prefix, limit)]
+
+
+def resolve(name):
+    """Return (catalog id, canonical name) for `name`, adding it if new."""
+    normalized = normalize(name)
+    index = get_index()
+    entry = index.get(normalized)
+    if entry:
+        return entry[1], entry[2]
+
+    # Insert-if-absent so two doctors adding the same new drug don't collide
+    result = db.session.execute(
+        sqlite_insert(MedicineCatalog)
+        .values(name=' '.join(name.split()), normalized_name=normalized)
+        .on_conflict_do_nothing(index_elements=['normalized_name'])
+    )
+    catalog_entry = MedicineCatalog.query.filter_by(normalized_name=normalized).one()
+    if result.rowcount:
+        # A Core insert, so the session events never see it
+        audit.record('create', 'MedicineCatalog', catalog_entry.id,
+                     {'name': catalog_entry.name, 'normalized_name': normalized})
+    index.add(normalized, catalog_entry.id, catalog_entry.name)
+    # Until commit, the new entry exists only in this transaction
+    db.session.info['medicine_index_added'] = True
+    return catalog_entry.id, catalog_entry.name
+
+
+def backfill():
+    """Link existing Medicine rows to the catalog, creating entries as needed.
+
+    Returns the number of distinct spellings linked.
+    """
+    spellings = db.session.query(Medicine.medicine_name).filter(
+        Medicine.catalog_id.is_(None)
+    ).distinct().all()
+    for (spelling,) in spellings:
+        if not spelling.strip():
+            continue
+        catalog_id, _ = resolve(spelling)
+        db.session.execute(
+            db.update(Medicine)
+            .where(Medicine.medicine_name == spelling, Medicine.catalog_id.is_(None))
+            .values(catalog_id=catalog_id)
+        )
+    return len(spellings)
+
+
+def _after_commit(session):
+    session.info.pop('medicine_index_added', None)
+
+
+def _after_rollback(session):
+    if session.info.pop('medicine_index_added', None) and current_app:
+        index = current_app.extensions.get('medicine_index')
+        if index:
+            index.invalidate()
+
+
+def init_app(app):
+    app.config.setdefault('MEDICINE_INDEX_REFRESH', 30)
+    app.extensions['medicine_index'] = PrefixIndex()
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -1,8 +1,29 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Columns added to tables that older databases already have, which
+# create_all() leaves alone: (table, column, DDL to add it)
+ADDED_COLUMNS = [
+    ('medicine', 'catalog_id', [
+        'ALTER TABLE medicine ADD COLUMN catalog_id INTEGER REFERENCES medicine_catalog (id)',
+        'CREATE INDEX IF NOT EXISTS ix_medicine_catalog_id ON medicine (catalog_id)',
+    ]),
+]
+
+def upgrade_schema():
+    """Add any ADDED_COLUMNS missing from an existing database. Run after
+    db.create_all(); commits."""
+    inspector = inspect(db.engine)
+    for table, column, statements in ADDED_COLUMNS:
+        if column not in {c['name'] for c in inspector.get_columns(table)}:
+            for statement in statements:
+                db.session.execute(text(statement))
+    db.session.commit()
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -74,9 +95,19 @@ class Treatment(db.Model):
     # Relationship for medicines
     medicines = db.relationship('Medicine', backref='treatment', lazy=True, cascade='all, delete-orphan')
 
+class MedicineCatalog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # display spelling
+    normalized_name = db.Column(db.String(100), unique=True, nullable=False)  # lower-cased, single-spaced
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    medicines = db.relationship('Medicine', backref='catalog_entry', lazy=True)
+
 class Medicine(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     treatment_id = db.Column(db.Integer, db.ForeignKey('treatment.id'), nullable=False)
+    catalog_id = db.Column(db.Integer, db.ForeignKey('medicine_catalog.id'), index=True)
     medicine_name = db.Column(db.String(100), nullable=False)
     dosage = db.Column(db.String(50))  # e.g., "1-0-1" (morning-afternoon-night)
 
@@ -90,3 +121,129 @@ class DoctorAvailability(db.Model):
     evening_booked = db.Column(db.Integer, default=0)
     max_appointments_per_slot = db.Column(db.Integer, default=10)
 
+
+class DoctorPatient(db.Model):
+    # Maintained on booking, completion and cancellation so the doctor
+    # dashboard and permission checks don't have to scan every appointment
+    # the doctor ever had. Cancelled appointments don't count; a pair whose
+    # appointments were all cancelled has no row
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'patient_id'),
+        db.Index('ix_doctor_patient_doctor_last_booking', 'doctor_id', 'last_booking'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False, index=True)
+    first_booking = db.Column(db.Date, nullable=False)  # earliest appointment date, may be upcoming
+    last_booking = db.Column(db.Date, nullable=False)  # latest appointment date, may be upcoming
+    booking_count = db.Column(db.Integer, default=0)  # booked or completed appointments
+    last_visit = db.Column(db.Date)  # latest completed appointment, None before the first
+    visit_count = db.Column(db.Integer, default=0)  # completed appointments
+    
+    patient = db.relationship('Patient')
+    
+    # Columns in the order _summary() selects them
+    SUMMARY_COLUMNS = ['doctor_id', 'patient_id', 'first_booking', 'last_booking',
+                       'booking_count', 'last_visit', 'visit_count']
+    
+    @classmethod
+    def record_booking(cls, doctor_id, patient_id, appointment_date):
+        # Single upsert statement, safe against concurrent bookings
+        stmt = sqlite_insert(cls).values(
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+            first_booking=appointment_date,
+            last_booking=appointment_date,
+            booking_count=1,
+            visit_count=0
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['doctor_id', 'patient_id'],
+            set_={
+                'first_booking': db.func.min(cls.first_booking, stmt.excluded.first_booking),
+                'last_booking': db.func.max(cls.last_booking, stmt.excluded.last_booking),
+                'booking_count': cls.booking_count + 1,
+            }
+        )
+        db.session.execute(stmt)
+    
+    @staticmethod
+    def _summary(*criteria):
+        # Per-pair figures over the appointments that weren't cancelled
+        completed = Appointment.status == 'Completed'
+        return db.select(
+            Appointment.doctor_id,
+            Appointment.patient_id,
+            db.func.min(Appointment.appointment_date),
+            db.func.max(Appointment.appointment_date),
+            db.func.count(Appointment.id),
+            db.func.max(db.case((completed, Appointment.appointment_date))),
+            db.func.count(db.case((completed, 1)))
+        ).where(Appointment.status != 'Cancelled', *criteria).group_by(
+            Appointment.doctor_id, Appointment.patient_id
+        )
+    
+    @classmethod
+    def refresh(cls, doctor_id, patient_id):
+        """Recompute one pair after one of its appointments was completed or
+        cancelled. Call after the status change; the query autoflushes it."""
+        row = db.session.execute(cls._summary(
+            Appointment.doctor_id == doctor_id, Appointment.patient_id == patient_id
+        )).first()
+        if row is None:
+            cls.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).delete()
+            return
+        values = dict(zip(cls.SUMMARY_COLUMNS, row))
+        stmt = sqlite_insert(cls).values(**values)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['doctor_id', 'patient_id'],
+            set_={column: stmt.excluded[column] for column in cls.SUMMARY_COLUMNS[2:]}
+        ))
+    
+    @classmethod
+    def backfill(cls):
+        # Rebuild the whole table from appointments in one set-based statement
+        cls.query.delete()
+        result = db.session.execute(db.insert(cls).from_select(cls.SUMMARY_COLUMNS, cls._summary()))
+        return result.rowcount
+    
+    @classmethod
+    def exists(cls, doctor_id, patient_id):
+        return db.session.query(
+            cls.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).exists()
+        ).scalar()
+
+class QueueEvent(db.Model):
+    # Change feed for the live doctor queue; also lets reconnecting clients
+    # replay what they missed and lets other workers pick events up
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False, index=True)
+    appointment_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # booked, cancelled, completed
+    payload = db.Column(db.Text, nullable=False)  # JSON sent to the browser
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class AuditLog(db.Model):
+    # Append-only; written in batches by the audit writer thread
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    user_id = db.Column(db.Integer, index=True)  # who made the change, None for scripts
+    username = db.Column(db.String(80))
+    action = db.Column(db.String(20), nullable=False)  # create, update, delete, or a named action
+    entity = db.Column(db.String(50), nullable=False, index=True)  # e.g. 'Doctor'
+    entity_id = db.Column(db.Integer)
+    changes = db.Column(db.Text)  # JSON
+    endpoint = db.Column(db.String(100))
+    ip = db.Column(db.String(45))
+
+class PendingPurge(db.Model):
+    # A deferred purge that hasn't finished yet; survives restarts so the
+    # blacklisted profile is still deleted eventually
+    __table_args__ = (db.UniqueConstraint('profile_type', 'profile_id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    profile_type = db.Column(db.String(20), nullable=False)  # 'Doctor' or 'Patient'
+    profile_id = db.Column(db.Integer, nullable=False)
+    actor = db.Column(db.Text)  # JSON: who asked for the purge, for the audit trail
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
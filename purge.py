@@ -0,0 +1,162 @@
+"""
+Deleting doctors and patients together with everything that hangs off them.
+
+Rather than loading each appointment through ORM cascades, the purge runs
+one set-based DELETE per table (medicines, treatments, queue events,
+doctor-patient links, appointments, availability, then the profile and
+user) inside a single transaction.
+
+Profiles with more than PURGE_DEFER_THRESHOLD appointments are purged by a
+background job instead. Until it runs the account is blacklisted, which
+hides it from every listing and blocks login, so the admin's request
+returns immediately.
+
+A deferred purge is recorded in the pending_purge table in the same commit
+as the blacklisting, and the marker is removed in the purge's own
+transaction. Purges still pending when a worker stopped are resumed on its
+first request after a restart, or by `flask --app app purge resume`.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import inspect
+from models import (db, User, Doctor, Patient, Appointment, Treatment, Medicine,
+                    DoctorAvailability, DoctorPatient, QueueEvent, PendingPurge)
+import audit
+
+
+def _delete(model, *criteria):
+    result = db.session.execute(
+        db.delete(model).where(*criteria).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def _purge(profile_model, profile_id, appointment_filter, link_filter, actor=None):
+    profile = db.session.get(profile_model, profile_id)
+    if profile is None:
+        return None
+    user_id = profile.user_id
+
+    appointment_ids = db.select(Appointment.id).where(appointment_filter)
+    treatment_ids = db.select(Treatment.id).where(Treatment.appointment_id.in_(appointment_ids))
+
+    counts = {
+        'medicines': _delete(Medicine, Medicine.treatment_id.in_(treatment_ids)),
+        'treatments': _delete(Treatment, Treatment.appointment_id.in_(appointment_ids)),
+        'queue_events': _delete(QueueEvent, QueueEvent.appointment_id.in_(appointment_ids)),
+        'doctor_patients': _delete(DoctorPatient, link_filter),
+        'appointments': _delete(Appointment, appointment_filter),
+    }
+    if profile_model is Doctor:
+        counts['availabilities'] = _delete(DoctorAvailability, DoctorAvailability.doctor_id == profile_id)
+    _delete(profile_model, profile_model.id == profile_id)
+    _delete(User, User.id == user_id)
+
+    # Bulk deletes bypass the session events, so record the purge explicitly
+    audit.record('purge', profile_model.__name__, profile_id, counts, actor)
+    db.session.expunge_all()
+    return counts
+
+
+def purge_doctor(doctor_id, actor=None):
+    """Delete a doctor and all their data. Caller commits."""
+    return _purge(Doctor, doctor_id, Appointment.doctor_id == doctor_id,
+                  DoctorPatient.doctor_id == doctor_id, actor)
+
+
+def purge_patient(patient_id, actor=None):
+    """Delete a patient and all their data. Caller commits."""
+    return _purge(Patient, patient_id, Appointment.patient_id == patient_id,
+                  DoctorPatient.patient_id == patient_id, actor)
+
+
+PURGES = {'Doctor': purge_doctor, 'Patient': purge_patient}
+
+
+def run_pending(pending_id):
+    """Carry out one pending purge and clear its marker. Commits."""
+    pending = db.session.get(PendingPurge, pending_id)
+    if pending is None:
+        # Already finished, e.g. by another worker resuming the same purge
+        return None
+    profile_type, profile_id = pending.profile_type, pending.profile_id
+    actor = json.loads(pending.actor) if pending.actor else None
+    counts = PURGES[profile_type](profile_id, actor)
+    _delete(PendingPurge, PendingPurge.id == pending_id)
+    db.session.commit()
+    return counts
+
+
+def _run_deferred(app, pending_id):
+    with app.app_context():
+        try:
+            run_pending(pending_id)
+        except Exception:
+            # The marker stays, so the purge is retried on the next resume
+            db.session.rollback()
+            app.logger.exception('deferred purge %s failed', pending_id)
+
+
+def _submit(app, pending_id):
+    app.extensions['purge']['executor'].submit(_run_deferred, app, pending_id)
+
+
+def pending_ids():
+    return [row.id for row in PendingPurge.query.order_by(PendingPurge.id)]
+
+
+def purge_or_defer(profile):
+    """Purge `profile` (a Doctor or Patient) now, or in the background if its
+    history is large. Commits. Returns True if the purge was deferred."""
+    if isinstance(profile, Doctor):
+        purge, appointment_filter = purge_doctor, Appointment.doctor_id == profile.id
+    else:
+        purge, appointment_filter = purge_patient, Appointment.patient_id == profile.id
+
+    appointments = db.session.query(db.func.count(Appointment.id)).filter(appointment_filter).scalar()
+    if appointments <= current_app.config['PURGE_DEFER_THRESHOLD']:
+        purge(profile.id)
+        db.session.commit()
+        return False
+
+    profile_type = type(profile).__name__
+    pending = PendingPurge.query.filter_by(profile_type=profile_type, profile_id=profile.id).first()
+    if pending is None:
+        pending = PendingPurge(profile_type=profile_type, profile_id=profile.id,
+                               actor=json.dumps(audit.current_actor()))
+        db.session.add(pending)
+    profile.user.is_blacklisted = True
+    db.session.commit()
+    _submit(current_app._get_current_object(), pending.id)
+    return True
+
+
+def resume_pending():
+    """before_request hook: once per process, requeue purges left unfinished
+    by an earlier run."""
+    app = current_app._get_current_object()
+    state = app.extensions['purge']
+    if state['resumed']:
+        return
+    with state['lock']:
+        if state['resumed']:
+            return
+        state['resumed'] = True
+        # A database that predates the table has nothing to resume
+        if not inspect(db.engine).has_table(PendingPurge.__tablename__):
+            return
+        for pending_id in pending_ids():
+            _submit(app, pending_id)
+
+
+def init_app(app):
+    app.config.setdefault('PURGE_DEFER_THRESHOLD', 500)
+    app.extensions['purge'] = {
+        # One job at a time: purges serialize on the SQLite writer anyway
+        'executor': ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge'),
+        'resumed': False,
+        'lock': threading.Lock(),
+    }
+    app.before_request(resume_pending)
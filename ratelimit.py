@@ -0,0 +1,239 @@
+"""
+Rate limiting and admission control for bursty endpoints.
+
+Limits are token buckets keyed per user, per client IP and per endpoint and
+are configured with the RATELIMITS setting, keyed by endpoint
+('auth.login') or by blueprint name ('patient'):
+
+    RATELIMITS = {
+        'auth.login': {'methods': ['POST'], 'ip': (10, 60), 'endpoint': (300, 60)},
+        'patient': {'methods': ['POST'], 'user': (30, 60)},
+    }
+
+Each scope is (capacity, period_seconds): a burst of `capacity` requests is
+allowed and tokens refill at capacity/period per second. Buckets live in
+process memory by default; set RATELIMIT_STORAGE to 'sqlite' to share them
+between workers through a small SQLite file kept apart from hospital.db.
+
+Per-IP limits use the address of the connecting peer. Behind a reverse
+proxy, wrap the app in werkzeug's ProxyFix so that address comes from the
+proxy's X-Forwarded-For header instead of being the proxy itself:
+
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+"""
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, request, session
+from werkzeug.exceptions import TooManyRequests
+
+
+SWEEP_INTERVAL = 60
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated, period)
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _sweep(self, now):
+        # A bucket untouched for a whole period has refilled completely and
+        # is indistinguishable from a new one, so forget it
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if now - bucket[1] < bucket[2]
+        }
+        self._last_sweep = now
+
+    def consume(self, key, capacity, period, now=None):
+        """Take one token from `key`. Returns seconds to wait, 0 if allowed."""
+        now = time.monotonic() if now is None else now
+        rate = capacity / period
+        with self._lock:
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now)
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, period))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, period)
+                return 0
+            self._buckets[key] = (tokens, now, period)
+            return (1 - tokens) / rate
+
+
+class SQLiteBucketStore:
+    """Token buckets shared by every worker through a SQLite file.
+
+    If the file stays locked for longer than `timeout`, the request is
+    charged to a bucket in this process instead, so a contended store never
+    turns into an open door.
+    """
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self._fallback = MemoryBucketStore()
+        self._local = threading.local()
+        self._last_sweep = 0
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_bucket ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+            'expires REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_bucket_expires ON rate_bucket (expires)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, period, now=None):
+        now = time.time() if now is None else now
+        rate = capacity / period
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            # The limiter must never become the bottleneck it protects
+            # against, but busy is exactly when it is needed most
+            return self._fallback.consume(key, capacity, period)
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0, now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            # After `period` idle seconds the bucket is full again and can go
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_bucket (key, tokens, updated, expires) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, now + period)
+            )
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                conn.execute('DELETE FROM rate_bucket WHERE expires < ?', (now,))
+                self._last_sweep = now
+            conn.execute('COMMIT')
+            return wait
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            return self._fallback.consume(key, capacity, period)
+
+
+class AdmissionQueue:
+    """Bounds how many requests may be in flight (or waiting) at once.
+
+    Requests beyond `size` wait up to `timeout` seconds for a slot and are then
+    rejected instead of queueing behind the SQLite writer lock.
+    """
+
+    def __init__(self, size, timeout=0.5):
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        return self._slots.acquire(timeout=self.timeout)
+
+    def release(self):
+        self._slots.release()
+
+
+def _bucket_keys(name, limits):
+    """Yield (key, capacity, period) for each configured scope of a limit.
+
+    Narrowest scope first: a client over its own limit is turned away before
+    it can drain the endpoint-wide bucket shared with everyone else.
+    """
+    for scope, key in (
+        ('user', session.get('user_id')),
+        # The peer address; X-Forwarded-For is only trusted via ProxyFix
+        ('ip', request.remote_addr),
+        ('endpoint', ''),
+    ):
+        if scope in limits and key is not None:
+            capacity, period = limits[scope]
+            yield f'{name}:{scope}:{key}', capacity, period
+
+
+def _limits_for(endpoint, blueprint):
+    config = current_app.config.get('RATELIMITS', {})
+    if endpoint in config:
+        return endpoint, config[endpoint]
+    if blueprint in config:
+        return blueprint, config[blueprint]
+    return None, None
+
+
+def check_rate_limit():
+    """before_request hook enforcing RATELIMITS for the current endpoint."""
+    if not current_app.config.get('RATELIMIT_ENABLED', True):
+        return
+    name, limits = _limits_for(request.endpoint, request.blueprint)
+    if not limits:
+        return
+    methods = limits.get('methods')
+    if methods and request.method not in methods:
+        return
+
+    store = current_app.extensions['ratelimit']['store']
+    for key, capacity, period in _bucket_keys(name, limits):
+        wait = store.consume(key, capacity, period)
+        if wait:
+            raise TooManyRequests(
+                'Too many requests. Please try again shortly.',
+                retry_after=max(1, int(wait + 0.999))
+            )
+
+
+def admission_controlled(queue_name):
+    """Run the view only if a slot in the named admission queue is free."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            queue = current_app.extensions['ratelimit']['queues'].get(queue_name)
+            if queue is None:
+                return f(*args, **kwargs)
+            if not queue.acquire():
+                raise TooManyRequests(
+                    'The system is busy right now. Please try again in a moment.',
+                    retry_after=1
+                )
+            try:
+                return f(*args, **kwargs)
+            finally:
+                queue.release()
+        return decorated_function
+    return decorator
+
+
+def _create_store(app):
+    if app.config.get('RATELIMIT_STORAGE', 'memory') == 'sqlite':
+        path = app.config.get('RATELIMIT_STORAGE_PATH') or os.path.join(app.instance_path, 'ratelimit.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SQLiteBucketStore(path)
+    return MemoryBucketStore()
+
+
+def init_app(app):
+    app.config.setdefault('RATELIMIT_ENABLED', True)
+    app.config.setdefault('RATELIMIT_STORAGE', 'memory')
+    app.config.setdefault('RATELIMITS', {})
+    app.config.setdefault('ADMISSION_QUEUES', {})
+
+    queues = {
+        name: AdmissionQueue(size, timeout)
+        for name, (size, timeout) in app.config['ADMISSION_QUEUES'].items()
+    }
+    app.extensions['ratelimit'] = {'store': _create_store(app), 'queues': queues}
+    app.before_request(check_rate_limit)
@@ -3,6 +3,8 @@ from werkzeug.security import generate_password_hash
 from datetime import datetime
 from models import db, User, Doctor, Patient, Appointment, Department
 from utils import role_required
+import audit
+import purge
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -117,11 +119,10 @@ def edit_doctor(doctor_id):
 @role_required(['admin'])
 def delete_doctor(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
-    user = doctor.user
-    db.session.delete(doctor)
-    db.session.delete(user)
-    db.session.commit()
-    flash('Doctor deleted successfully!', 'success')
+    if purge.purge_or_defer(doctor):
+        flash('Doctor has a long history and is being deleted in the background.', 'info')
+    else:
+        flash('Doctor deleted successfully!', 'success')
     return redirect(url_for('admin.doctors'))
 
 @admin_bp.route('/doctors/<int:doctor_id>/blacklist', methods=['POST'])
@@ -175,11 +176,10 @@ def edit_patient(patient_id):
 @role_required(['admin'])
 def delete_patient(patient_id):
     patient = Patient.query.get_or_404(patient_id)
-    user = patient.user
-    db.session.delete(patient)
-    db.session.delete(user)
-    db.session.commit()
-    flash('Patient deleted successfully!', 'success')
+    if purge.purge_or_defer(patient):
+        flash('Patient has a long history and is being deleted in the background.', 'info')
+    else:
+        flash('Patient deleted successfully!', 'success')
     return redirect(url_for('admin.patients'))
 
 @admin_bp.route('/patients/<int:patient_id>/blacklist', methods=['POST'])
@@ -213,3 +213,21 @@ def view_patient_history(appointment_id):
     
     return render_template('admin/patient_history.html', patient=patient, appointments=all_appointments)
 
+@admin_bp.route('/audit')
+@role_required(['admin'])
+def audit_log():
+    entity = request.args.get('entity', '')
+    action = request.args.get('action', '')
+    username = request.args.get('username', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    entries, has_next = audit.query(entity=entity, action=action, username=username, page=page)
+    return render_template('admin/audit.html',
+                         entries=entries,
+                         has_next=has_next,
+                         page=page,
+                         entity=entity,
+                         action=action,
+                         username=username,
+                         entities=[m.__name__ for m in audit.AUDITED_MODELS])
+
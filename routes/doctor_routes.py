@@ -1,10 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, Response, stream_with_context, jsonify
 from datetime import datetime, timedelta
-from models import db, Doctor, Patient, Appointment, Treatment, Medicine, DoctorAvailability
+from models import db, Doctor, Patient, Appointment, Treatment, Medicine, DoctorAvailability, DoctorPatient
 from utils import role_required
+import live_queue
+import medicine_catalog
 
 doctor_bp = Blueprint('doctor', __name__, url_prefix='/doctor')
 
+PATIENTS_PER_PAGE = 10
+
 @doctor_bp.route('/dashboard')
 @role_required(['doctor'])
 def dashboard():
@@ -15,21 +19,46 @@ def dashboard():
     
     today = datetime.now().date()
     
+    # Taken before the queries below; the live stream replays anything newer
+    last_event_id = live_queue.latest_id(doctor.id)
+    
     upcoming_appointments = Appointment.query.filter(
         Appointment.doctor_id == doctor.id,
         Appointment.status == 'Booked',
         Appointment.appointment_date >= today
     ).order_by(Appointment.appointment_date, Appointment.appointment_time).all()
     
-    # Get assigned patients (patients who have appointments with this doctor)
-    assigned_patients = db.session.query(Patient).join(Appointment).filter(
-        Appointment.doctor_id == doctor.id
-    ).distinct().all()
+    # Get assigned patients (patients who have appointments with this doctor),
+    # latest booking first
+    assigned_patients = DoctorPatient.query.filter_by(doctor_id=doctor.id).options(
+        db.joinedload(DoctorPatient.patient)
+    ).order_by(DoctorPatient.last_booking.desc(), DoctorPatient.id.desc()).paginate(
+        page=request.args.get('patients_page', 1, type=int),
+        per_page=PATIENTS_PER_PAGE,
+        error_out=False
+    )
     
     return render_template('doctor/dashboard.html',
                          doctor=doctor,
                          upcoming_appointments=upcoming_appointments,
-                         assigned_patients=assigned_patients)
+                         assigned_patients=assigned_patients,
+                         last_event_id=last_event_id)
+
+@doctor_bp.route('/queue/stream')
+@role_required(['doctor'])
+def queue_stream():
+    doctor = Doctor.query.filter_by(user_id=session['user_id']).first_or_404()
+    # The browser sends the header on reconnects; the first connect carries
+    # the id the dashboard was rendered at instead
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    
+    response = Response(stream_with_context(live_queue.stream(doctor.id, last_event_id)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @doctor_bp.route('/availability', methods=['GET', 'POST'])
 @role_required(['doctor'])
@@ -40,14 +69,16 @@ def availability():
         return redirect(url_for('auth.logout'))
     
     if request.method == 'POST':
-        # Clear existing availability for next 7 days
+        # Clear existing availability for next 7 days, through the session
+        # so the audit trail sees each removed row
         start_date = datetime.now().date()
         end_date = start_date + timedelta(days=6)
-        DoctorAvailability.query.filter(
+        for availability in DoctorAvailability.query.filter(
             DoctorAvailability.doctor_id == doctor.id,
             DoctorAvailability.date >= start_date,
             DoctorAvailability.date <= end_date
-        ).delete()
+        ):
+            db.session.delete(availability)
         
         # Add new availability
         for i in range(7):
@@ -95,6 +126,8 @@ def update_appointment(appointment_id):
         
         if action == 'complete':
             appointment.status = 'Completed'
+            DoctorPatient.refresh(appointment.doctor_id, appointment.patient_id)
+            live_queue.record(appointment, 'completed')
             
             # Create or update treatment
             treatment = Treatment.query.filter_by(appointment_id=appointment.id).first()
@@ -108,14 +141,18 @@ def update_appointment(appointment_id):
             treatment.prescription = request.form.get('prescription')
             treatment.notes = request.form.get('notes')
             
-            # Handle medicines
-            Medicine.query.filter_by(treatment_id=treatment.id).delete()
+            # Handle medicines; deleted through the session (a handful of rows)
+            # so the audit trail records what was replaced
+            for medicine in Medicine.query.filter_by(treatment_id=treatment.id):
+                db.session.delete(medicine)
             medicine_names = request.form.getlist('medicine_name[]')
             dosages = request.form.getlist('dosage[]')
             
             for name, dosage in zip(medicine_names, dosages):
                 if name.strip():
-                    medicine = Medicine(treatment_id=treatment.id, medicine_name=name, dosage=dosage)
+                    catalog_id, canonical_name = medicine_catalog.resolve(name)
+                    medicine = Medicine(treatment_id=treatment.id, catalog_id=catalog_id,
+                                        medicine_name=canonical_name, dosage=dosage.strip())
                     db.session.add(medicine)
             
             db.session.commit()
@@ -123,6 +160,8 @@ def update_appointment(appointment_id):
         
         elif action == 'cancel':
             appointment.status = 'Cancelled'
+            DoctorPatient.refresh(appointment.doctor_id, appointment.patient_id)
+            live_queue.record(appointment, 'cancelled')
             db.session.commit()
             flash('Appointment cancelled!', 'success')
         
@@ -131,12 +170,24 @@ def update_appointment(appointment_id):
     treatment = Treatment.query.filter_by(appointment_id=appointment.id).first()
     return render_template('doctor/update_appointment.html', appointment=appointment, treatment=treatment)
 
+@doctor_bp.route('/medicines/autocomplete')
+@role_required(['doctor'])
+def medicine_autocomplete():
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify([])
+    return jsonify(medicine_catalog.search(prefix, limit=request.args.get('limit', 10, type=int)))
+
 @doctor_bp.route('/patients/<int:patient_id>/history')
 @role_required(['doctor'])
 def view_patient_history(patient_id):
     doctor = Doctor.query.filter_by(user_id=session['user_id']).first()
     patient = Patient.query.get_or_404(patient_id)
     
+    if not DoctorPatient.exists(doctor.id, patient.id):
+        flash('You do not have permission to view this patient.', 'danger')
+        return redirect(url_for('doctor.dashboard'))
+    
     # Get all appointments for this patient with this doctor
     appointments = Appointment.query.filter(
         Appointment.patient_id == patient.id,
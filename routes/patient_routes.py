@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from datetime import datetime, timedelta
-from models import db, Patient, Doctor, Department, Appointment, DoctorAvailability
+from models import db, Patient, Doctor, Department, Appointment, DoctorAvailability, DoctorPatient
 from utils import role_required
+from ratelimit import admission_controlled
+import live_queue
 
 patient_bp = Blueprint('patient', __name__, url_prefix='/patient')
 
@@ -90,6 +92,7 @@ def doctor_availability(doctor_id):
 
 @patient_bp.route('/appointments/book', methods=['POST'])
 @role_required(['patient'])
+@admission_controlled('booking')
 def book_appointment():
     patient = Patient.query.filter_by(user_id=session['user_id']).first()
     doctor_id = request.form.get('doctor_id', type=int)
@@ -156,6 +159,8 @@ def book_appointment():
         status='Booked'
     )
     db.session.add(appointment)
+    DoctorPatient.record_booking(doctor_id, patient.id, appointment_date)
+    live_queue.record(appointment, 'booked')
     db.session.commit()
     
     flash('Appointment booked successfully!', 'success')
@@ -176,6 +181,8 @@ def cancel_appointment(appointment_id):
         return redirect(url_for('patient.dashboard'))
     
     appointment.status = 'Cancelled'
+    DoctorPatient.refresh(appointment.doctor_id, appointment.patient_id)
+    live_queue.record(appointment, 'cancelled')
     db.session.commit()
     flash('Appointment cancelled successfully!', 'success')
     return redirect(url_for('patient.dashboard'))